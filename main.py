@@ -1,16 +1,37 @@
 #!/usr/bin/env python3
+from __future__ import annotations
 import os
 import sys
+import argparse
+import atexit
+import itertools
 import asyncio
-import time
+import io
+import re
+import hashlib
+import json
 from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.parse import quote
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-import requests
-import feedparser
-import openai
-import smtplib
-from email.message import EmailMessage
+import aiohttp
+import orjson
+import ciso8601
+from lxml import etree
+import lxml.html
+from diskcache import Cache
+from html import escape
+from email.utils import parsedate_to_datetime
+
+if TYPE_CHECKING:
+    import smtplib
+
+try:
+    import brotli  # noqa: F401 -- lets aiohttp decode 'br' responses
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
 
 # Load environment variables from .env
 env_path = Path(__file__).parent / ".env"
@@ -24,6 +45,7 @@ SMTP_PORT       = int(os.getenv("SMTP_PORT", "587"))
 EMAIL_ADDRESS   = os.getenv("EMAIL_ADDRESS")
 EMAIL_PASSWORD  = os.getenv("EMAIL_PASSWORD")
 RECIPIENT_EMAIL = os.getenv("RECIPIENT_EMAIL")
+SUMMARIZER_MODEL = os.getenv("SUMMARIZER_MODEL", "gpt-4o-mini")
 
 # Validate presence
 for var, name in [
@@ -37,139 +59,548 @@ for var, name in [
     if not var:
         raise EnvironmentError(f"Please set {name} in your .env file")
 
-openai.api_key = OPENAI_API_KEY
-
 # Endpoints & defaults
 NEWSAPI_URL     = "https://newsapi.org/v2/everything"
 GOOGLE_RSS_BASE = "https://news.google.com/rss/search"
+NEWSAPI_MAX_Q   = 500  # NewsAPI rejects longer 'q' values
+FETCH_TIMEOUT   = 8    # seconds, per request
+FETCH_DEADLINE  = 12   # seconds, for the whole fetch stage
+HTTP_HEADERS    = {
+    "User-Agent":      "Mozilla/5.0 (compatible; news-digest/1.0)",
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
 DEFAULT_COUNT   = 5
+MIN_TS          = datetime.min.replace(tzinfo=timezone.utc)  # sorts undated articles last
+OPENAI_CONCURRENCY = 10  # max simultaneous per-article requests
+SUMMARY_MAX_TOKENS = 90   # per article; summaries are 2-3 sentences
+SUMMARY_JSON_TOKENS = 20  # per article, for the batch reply's JSON framing
+SUMMARY_TEMPERATURE = 0.2
+SUMMARY_STOP = ["\nNOT RELEVANT", "\n\n"]  # single-article replies are one paragraph
+BATCH_POLL_INTERVAL = 60  # seconds between Batch API status checks
+
+# Local relevance pre-filter
+EMBEDDING_MODEL     = "all-MiniLM-L6-v2"
+RELEVANCE_THRESHOLD = 0.4
+_embedder = None
+
+# OpenAI client, created on first use; one per run so its httpx pool keeps
+# api.openai.com connections alive
+_aclient = None
+
+# Shared HTTP session (created lazily inside the running event loop)
+_session: aiohttp.ClientSession | None = None
 
-def fetch_newsapi(topic: str, max_items: int = DEFAULT_COUNT) -> list:
+# Logged-in SMTP connection, reused across send_email calls
+_smtp: smtplib.SMTP | None = None
+
+# Per-article summary cache, keyed by topic + article content
+SUMMARY_CACHE_DIR = Path(__file__).parent / ".openai_cache"
+SUMMARY_TTL       = 4 * 60 * 60  # seconds
+NOT_RELEVANT      = "__NR__"     # cached verdict for irrelevant articles
+_summaries = Cache(str(SUMMARY_CACHE_DIR))
+
+# RSS validators (ETag / Last-Modified) and parsed items, keyed by feed URL
+FEED_CACHE_DIR = Path(__file__).parent / ".feed_cache"
+FEED_CACHE_TTL = 24 * 60 * 60  # seconds; topics not fetched for a day age out
+_feeds = Cache(str(FEED_CACHE_DIR))
+
+def as_utc(dt: datetime) -> datetime:
+    """Normalize dt to an aware UTC datetime (naive values are taken as UTC)."""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+async def get_session() -> aiohttp.ClientSession:
+    """Return the shared aiohttp session, creating it on first use."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=100,
+            limit_per_host=10,
+            enable_cleanup_closed=True,
+            ttl_dns_cache=300,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            headers=HTTP_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT),
+        )
+    return _session
+
+async def close_session():
+    """Close the shared aiohttp session, if open."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+async def fetch_newsapi(topic: str, max_items: int = DEFAULT_COUNT) -> list:
     """Fetch recent articles from NewsAPI."""
     params = {
-        "q": topic,
+        "q": topic[:NEWSAPI_MAX_Q],
         "apiKey": NEWS_API_KEY,
         "language": "en",
         "pageSize": max_items,
         "sortBy": "publishedAt"
     }
-    r = requests.get(NEWSAPI_URL, params=params, timeout=10)
-    r.raise_for_status()
+    session = await get_session()
+    async with session.get(NEWSAPI_URL, params=params) as r:
+        r.raise_for_status()
+        data = orjson.loads(await r.read())
     out = []
-    for art in r.json().get("articles", []):
+    for art in data.get("articles", []):
+        if not art.get("title"):
+            continue  # summaries are keyed by title, so untitled items can't be told apart
+        try:
+            ts = as_utc(ciso8601.parse_datetime(art.get("publishedAt") or ""))
+        except ValueError:
+            ts = None
         out.append({
             "title":       art.get("title"),
             "link":        art.get("url"),
             "source":      art.get("source", {}).get("name","NewsAPI"),
             "publishedAt": art.get("publishedAt",""),
-            "summary":     art.get("description","")
+            "summary":     art.get("description",""),
+            "_ts":         ts
         })
     return out
 
-async def fetch_google_rss(topic: str, max_items: int = DEFAULT_COUNT) -> list:
-    """Fetch recent items from Google News RSS."""
-    q = requests.utils.quote(topic)
-    url = f"{GOOGLE_RSS_BASE}?q={q}&hl=en-US&gl=US&ceid=US:en"
-    feed = feedparser.parse(url)
+def parse_google_rss(data: bytes, max_items: int = DEFAULT_COUNT) -> list:
+    """Turn Google News RSS bytes into article dicts, stopping after max_items."""
     out = []
-    for entry in feed.entries[:max_items]:
-        pp = entry.get("published_parsed")
-        if pp:
-            ts = time.mktime(pp)
-            dt = datetime.fromtimestamp(ts, tz=timezone.utc)
-            pub = dt.isoformat()
-        else:
-            pub = ""
+    if max_items <= 0:
+        return out
+    # Feed XML is untrusted: never expand DTD entities or fetch external resources
+    items = etree.iterparse(io.BytesIO(data), events=("end",), tag="item",
+                            resolve_entities=False, no_network=True)
+    for _, item in items:
+        title = item.findtext("title", "")
+        if not title:
+            item.clear()
+            continue  # summaries are keyed by title, so untitled items can't be told apart
+        try:
+            ts = as_utc(parsedate_to_datetime(item.findtext("pubDate")))
+            pub = ts.isoformat()
+        except (TypeError, ValueError):
+            ts, pub = None, ""
         out.append({
-            "title":       entry.get("title",""),
-            "link":        entry.get("link",""),
+            "title":       title,
+            "link":        item.findtext("link", ""),
             "source":      "Google News RSS",
             "publishedAt": pub,
-            "summary":     entry.get("summary","")
+            "summary":     item.findtext("description", ""),
+            "_ts":         ts
         })
+        item.clear()
+        if len(out) >= max_items:
+            break
     return out
 
-def summarize_if_relevant(topic: str, article: dict) -> str | None:
+async def fetch_google_rss(topic: str, max_items: int = DEFAULT_COUNT) -> list:
     """
-    Use OpenAI to check relevance and summarize.
-    Returns None if not relevant, otherwise a concise 2-3 sentence summary.
+    Fetch recent items from Google News RSS.
+    Sends the validators from the previous fetch so an unchanged feed comes back
+    as 304, and hashes the body so a byte-identical 200 is recognized too; in both
+    cases the cached items are reused without re-parsing.
     """
-    prompt = f"""Topic: {topic}
+    q = quote(topic)
+    url = f"{GOOGLE_RSS_BASE}?q={q}&hl=en-US&gl=US&ceid=US:en"
+    key = (url, max_items)
+    cached = _feeds.get(key)
+    headers = {}
+    if cached:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+    session = await get_session()
+    async with session.get(url, headers=headers) as resp:
+        if resp.status == 304 and cached:
+            _feeds.touch(key, expire=FEED_CACHE_TTL)  # still in use: restart its TTL
+            return cached["items"]
+        resp.raise_for_status()
+        data = await resp.read()
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    if cached and cached.get("digest") == digest:
+        out = cached["items"]
+    else:
+        # Parse off the event loop so it doesn't stall the concurrent NewsAPI fetch
+        out = await asyncio.to_thread(parse_google_rss, data, max_items)
+    _feeds.set(key, {"etag": etag, "last_modified": last_modified,
+                     "digest": digest, "items": out}, expire=FEED_CACHE_TTL)
+    return out
+
+async def fetch_all(topic: str, on_fetched=None) -> tuple[list, list]:
+    """
+    Fetch NewsAPI and Google News RSS concurrently.
+    on_fetched(articles), if given, is called with each source's articles as soon as it arrives.
+    A source that fails or misses FETCH_DEADLINE is reported and contributes no articles.
+    """
+    sources = {
+        "NewsAPI":         asyncio.create_task(fetch_newsapi(topic)),
+        "Google News RSS": asyncio.create_task(fetch_google_rss(topic)),
+    }
+    try:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + FETCH_DEADLINE
+        pending = set(sources.values())
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=deadline - loop.time(),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                if on_fetched and task.exception() is None:
+                    on_fetched(task.result())
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        results = []
+        for name, task in sources.items():
+            if task not in pending and task.exception() is None:
+                results.append(task.result())
+                continue
+            reason = "timed out" if task in pending else repr(task.exception())
+            print(f"⚠️  {name} fetch failed: {reason}", file=sys.stderr)
+            results.append([])
+        return tuple(results)
+    finally:
+        await close_session()
+
+def get_embedder():
+    """Load the sentence-transformers model once, or None if it isn't installed."""
+    global _embedder
+    if _embedder is None:
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:  # optional: without it only keyword matches go to OpenAI
+            return None
+        _embedder = SentenceTransformer(EMBEDDING_MODEL)
+    return _embedder
+
+def topic_pattern(topic: str) -> re.Pattern:
+    """
+    Regex matching the start of any 3+ character word of the topic, so word forms
+    still match ("election" finds "Elections"), plus its 2-character tokens
+    ("AI", "EV") as whole words only, so "AI" doesn't match "said".
+    A topic with neither is matched whole.
+    """
+    topic_cf = topic.casefold()
+    tokens = re.findall(r"\w+", topic_cf)
+    parts = [re.escape(w) for w in tokens if len(w) >= 3]
+    short = [w for w in tokens if len(w) == 2] or ([] if parts else [topic_cf.strip()])
+    # Lookarounds rather than \b so topics ending in symbols ("C++") still match
+    parts += [re.escape(w) + r"(?!\w)" for w in short]
+    return re.compile(r"(?<!\w)(?:" + "|".join(parts) + ")")
+
+def plain_text(snippet: str) -> str:
+    """Text content of a snippet that may be HTML (Google News descriptions are)."""
+    if "<" not in snippet:
+        return snippet
+    try:
+        return lxml.html.fromstring(snippet).text_content()
+    except (etree.ParserError, ValueError):
+        return snippet
+
+def filter_relevant(topic: str, articles: list) -> list:
+    """
+    Drop clearly off-topic articles before they reach OpenAI.
+    Articles sharing a word with the topic are kept. The rest are scored against
+    the topic in one batched local embedding pass if sentence-transformers is
+    installed, and dropped otherwise.
+    """
+    pat = topic_pattern(topic)
+    keep = [False] * len(articles)
+    texts, pending = [], []
+    for i, art in enumerate(articles):
+        text = f"{art.get('title') or ''} {plain_text(art.get('summary') or '')}"
+        if pat.search(text.casefold()):
+            keep[i] = True
+        else:
+            texts.append(text)
+            pending.append(i)
+    model = get_embedder() if texts else None
+    if model is not None:
+        topic_emb = model.encode([topic], normalize_embeddings=True)
+        entry_embs = model.encode(texts, batch_size=32, normalize_embeddings=True)
+        sims = (entry_embs @ topic_emb.T).ravel()
+        for i, sim in zip(pending, sims):
+            keep[i] = sim > RELEVANCE_THRESHOLD
+    return [art for art, k in zip(articles, keep) if k]
+
+def get_openai():
+    """Return the shared async OpenAI client, importing openai on first use."""
+    global _aclient
+    if _aclient is None:
+        import openai
+        _aclient = openai.AsyncOpenAI(api_key=OPENAI_API_KEY, timeout=30.0, max_retries=2)
+    return _aclient
+
+async def complete(prompt: str, model: str, temperature: float, max_tokens: int,
+                   json_mode: bool = False, stop: list[str] | None = None) -> str:
+    """Return the chat completion text for a single-message prompt."""
+    extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+    if stop:
+        extra["stop"] = stop
+    resp = await get_openai().chat.completions.create(
+        model=model,
+        messages=[{"role":"user","content":prompt}],
+        temperature=temperature,
+        max_tokens=max_tokens,
+        **extra,
+    )
+    return resp.choices[0].message.content
+
+def summary_key(topic: str, article: dict) -> str:
+    """Cache key for an article's verdict on a topic from SUMMARIZER_MODEL."""
+    raw = f"{SUMMARIZER_MODEL}|{topic}|{article['title']}|{article.get('summary') or ''}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def article_prompt(topic: str, article: dict) -> str:
+    """Single-article relevance + summary prompt."""
+    return f"""Topic: {topic}
 Title: {article['title']}
 Summary: {article.get('summary','')}
 
 If this article is relevant to the topic, provide a concise email-friendly summary in 2–3 sentences.
 If not relevant, respond with 'NOT RELEVANT'."""
-    resp = openai.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role":"user","content":prompt}],
-        temperature=0.7,
-        max_tokens=150,
-    )
-    text = resp.choices[0].message.content.strip()
+
+def parse_verdict(text: str) -> str | None:
+    """Map a single-article reply to its summary, or None if not relevant."""
+    text = text.strip()
     if text.upper().startswith("NOT RELEVANT"):
         return None
     return text
 
+async def summarize_if_relevant(topic: str, article: dict) -> str | None:
+    """
+    Use OpenAI to check relevance and summarize.
+    Returns None if not relevant, otherwise a concise 2-3 sentence summary.
+    """
+    text = await complete(article_prompt(topic, article), model=SUMMARIZER_MODEL,
+                          temperature=SUMMARY_TEMPERATURE, max_tokens=SUMMARY_MAX_TOKENS,
+                          stop=SUMMARY_STOP)
+    return parse_verdict(text)
+
+async def summarize_each(topic: str, articles: list) -> list[str | None]:
+    """Summarize articles with one request each, up to OPENAI_CONCURRENCY at a time."""
+    sem = asyncio.Semaphore(OPENAI_CONCURRENCY)
+    async def one(art):
+        async with sem:
+            return await summarize_if_relevant(topic, art)
+    return await asyncio.gather(*(one(art) for art in articles))
+
+async def summarize_batch(topic: str, articles: list, use_batch_api: bool = False) -> dict[str,str]:
+    """
+    Check relevance and summarize all articles with a single OpenAI request
+    (or, with use_batch_api, a single Batch API job).
+    Verdicts are cached per article for SUMMARY_TTL, so only unseen articles are sent.
+    Returns {title: summary} for the relevant ones, in article order.
+    """
+    verdicts = {}
+    todo = []
+    for i, art in enumerate(articles):
+        hit = _summaries.get(summary_key(topic, art))
+        if hit is None:
+            todo.append(i)
+        else:
+            verdicts[i] = None if hit == NOT_RELEVANT else hit
+    if todo:
+        summarize = summarize_via_batch_api if use_batch_api else summarize_uncached
+        fresh = await summarize(topic, [articles[i] for i in todo])
+        for i, s in zip(todo, fresh):
+            verdicts[i] = s
+            _summaries.set(summary_key(topic, articles[i]), s or NOT_RELEVANT, expire=SUMMARY_TTL)
+    return {art["title"]: verdicts[i] for i, art in enumerate(articles) if verdicts[i]}
+
+async def summarize_uncached(topic: str, articles: list) -> list[str | None]:
+    """Ask OpenAI about all articles in one request; returns a summary or None per article."""
+    blocks = "\n\n".join(
+        f"{i}. Title: {art['title']}\n   Summary: {art.get('summary') or ''}"
+        for i, art in enumerate(articles, 1)
+    )
+    prompt = f"""Topic: {topic}
+
+For each of the following {len(articles)} articles, decide whether it is relevant to the topic.
+If it is, write a concise email-friendly summary in 2–3 sentences.
+Respond with a JSON object {{"articles": [{{"i": int, "r": bool, "s": str}}]}} containing one entry per article,
+where "i" is the article number, "r" is whether it is relevant and "s" is the summary ("" if not relevant).
+
+{blocks}"""
+    text = await complete(prompt, model=SUMMARIZER_MODEL, temperature=SUMMARY_TEMPERATURE,
+                          max_tokens=(SUMMARY_MAX_TOKENS + SUMMARY_JSON_TOKENS) * len(articles),
+                          json_mode=True)
+    try:
+        items = json.loads(text)["articles"]
+    except (ValueError, KeyError, TypeError):
+        items = []
+    # Only trust well-typed entries: {"r": false} or {"r": true, "s": "<summary>"}
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            i = int(item.get("i"))
+        except (TypeError, ValueError):
+            continue
+        r, s = item.get("r"), item.get("s")
+        if r is False:
+            results[i] = None
+        elif r is True and isinstance(s, str) and s.strip():
+            results[i] = s.strip()
+
+    # Articles left out of (or malformed in) the batch reply: ask about each one alone
+    missing = [i for i in range(1, len(articles) + 1) if i not in results]
+    retried = dict(zip(missing, await summarize_each(topic, [articles[i - 1] for i in missing])))
+    return [retried[i] if i in retried else results[i] for i in range(1, len(articles) + 1)]
+
+async def summarize_via_batch_api(topic: str, articles: list) -> list[str | None]:
+    """
+    Submit one request per article as an OpenAI Batch API job and wait for it.
+    Half the price of live requests, but the job may take up to 24h; articles the
+    job doesn't return a result for are summarized live instead.
+    """
+    ids = [summary_key(topic, art) for art in articles]
+    lines = [orjson.dumps({
+        "custom_id": cid,
+        "method":    "POST",
+        "url":       "/v1/chat/completions",
+        "body": {
+            "model":       SUMMARIZER_MODEL,
+            "messages":    [{"role":"user","content":article_prompt(topic, art)}],
+            "temperature": SUMMARY_TEMPERATURE,
+            "max_tokens":  SUMMARY_MAX_TOKENS,
+            "stop":        SUMMARY_STOP,
+        },
+    }) for cid, art in zip(ids, articles)]
+    client = get_openai()
+    upload = await client.files.create(file=("digest.jsonl", b"\n".join(lines)), purpose="batch")
+    batch = await client.batches.create(
+        input_file_id=upload.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    print(f"Submitted batch {batch.id}; waiting for results...")
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        await asyncio.sleep(BATCH_POLL_INTERVAL)
+        batch = await client.batches.retrieve(batch.id)
+
+    replies = {}
+    if batch.status == "completed" and batch.output_file_id:
+        output = await client.files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            rec = orjson.loads(line)
+            body = (rec.get("response") or {}).get("body") or {}
+            if body.get("choices"):
+                replies[rec["custom_id"]] = body["choices"][0]["message"]["content"]
+    else:
+        print(f"⚠️  Batch {batch.id} ended with status '{batch.status}'", file=sys.stderr)
+
+    missing = [art for cid, art in zip(ids, articles) if cid not in replies]
+    retried = iter(await summarize_each(topic, missing))
+    return [parse_verdict(replies[cid]) if cid in replies else next(retried) for cid in ids]
+
 def sort_by_date(articles: list) -> list:
-    """Sort articles by 'publishedAt' descending."""
-    def to_dt(a):
-        s = a.get("publishedAt","")
+    """Sort articles by publish time ('_ts', parsed at fetch time) descending."""
+    return sorted(articles, key=lambda a: a.get("_ts") or MIN_TS, reverse=True)
+
+def _norm_title(art: dict) -> str:
+    """
+    Casefold a headline and drop all non-alphanumerics. Google News appends
+    ' - Publisher' to its titles, so that suffix is dropped for its items only.
+    """
+    title = art.get("title") or ""
+    if art.get("source") == "Google News RSS":
+        title = title.rsplit(" - ", 1)[0]
+    return re.sub(r"\W+", "", title.casefold())
+
+def dedupe(articles: list) -> list:
+    """Drop articles whose link (ignoring the query string) or headline was already seen."""
+    seen = set()
+    out = []
+    for art in articles:
+        keys = {("link", (art.get("link") or "").split("?")[0]),
+                ("title", _norm_title(art))}
+        keys = {k for k in keys if k[1]}
+        if keys & seen:
+            continue
+        seen |= keys
+        out.append(art)
+    return out
+
+def get_smtp() -> smtplib.SMTP:
+    """Return a logged-in SMTP connection, reusing the previous one while it's alive."""
+    import smtplib
+    global _smtp
+    if _smtp is not None:
+        try:
+            if _smtp.noop()[0] == 250:
+                return _smtp
+        except (smtplib.SMTPException, OSError):
+            pass
+        close_smtp()
+    smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
+    smtp.starttls()
+    smtp.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
+    _smtp = smtp
+    return smtp
+
+def close_smtp():
+    """Log out of the shared SMTP connection, if open."""
+    global _smtp
+    if _smtp is not None:
+        import smtplib
         try:
-            dt = datetime.fromisoformat(s.replace("Z","+00:00"))
-            return dt.astimezone(timezone.utc).replace(tzinfo=None)
-        except:
-            return datetime.min
-    return sorted(articles, key=to_dt, reverse=True)
+            _smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            _smtp.close()
+    _smtp = None
+
+atexit.register(close_smtp)
 
 def send_email(topic: str, articles: list[dict], summaries: dict[str,str]):
     """Send a polished HTML + plain-text email with spacing."""
-    # HTML summary items
-    summary_items = []
+    # One pass over the articles fills both the HTML and the plain-text parts
+    summary_html, link_html = [], []
+    summary_text, link_text = [], []
     for art in articles:
         t = art["title"]
-        if t in summaries:
-            summary_items.append(
+        s = summaries.get(t)
+        link = art["link"] or ""
+        if s is not None:
+            summary_html.append(
                 f"<li style='margin-bottom:12px;'>"
-                f"<strong>{t}</strong><br>{summaries[t]}"
+                f"<strong>{escape(t)}</strong><br>{escape(s)}"
                 "</li>"
             )
-    # HTML link items
-    link_items = []
-    for art in articles:
-        link_items.append(
-            f"<li style='margin-bottom:8px;'><a href='{art['link']}' target='_blank'>{art['title']}</a></li>"
+            summary_text += [t, s, ""]  # extra blank line
+        link_html.append(
+            f"<li style='margin-bottom:8px;'><a href='{escape(link)}' target='_blank'>{escape(t)}</a></li>"
         )
+        link_text += [t, link, ""]  # extra blank line
+
     html = f"""\
 <html>
   <body style="font-family:Arial,sans-serif; line-height:1.4;">
-    <h1 style="font-size:28px; margin-bottom:8px;">📰 News Digest: {topic}</h1>
+    <h1 style="font-size:28px; margin-bottom:8px;">📰 News Digest: {escape(topic)}</h1>
     <p>Top {len(summaries)} summaries</p>
     <ul style="padding-left:16px;">
-      {''.join(summary_items)}
+      {''.join(summary_html)}
     </ul>
     <h2 style="font-size:20px; margin-top:24px; margin-bottom:8px;">🔗 Links</h2>
     <ul style="padding-left:16px;">
-      {''.join(link_items)}
+      {''.join(link_html)}
     </ul>
   </body>
 </html>
 """
     # Plain-text fallback with extra blank lines
-    text_lines = [f"News Digest: {topic}", "", f"Top {len(summaries)} summaries:", ""]
-    for art in articles:
-        t = art["title"]
-        if t in summaries:
-            text_lines.append(t)
-            text_lines.append(summaries[t])
-            text_lines.append("")  # extra blank line
-    text_lines.append("Links:")
-    text_lines.append("")
-    for art in articles:
-        text_lines.append(art["title"])
-        text_lines.append(art["link"])
-        text_lines.append("")  # extra blank line
+    text_lines = [f"News Digest: {topic}", "", f"Top {len(summaries)} summaries:", "",
+                  *summary_text, "Links:", "", *link_text]
 
+    from email.message import EmailMessage
     msg = EmailMessage()
     msg["From"]    = EMAIL_ADDRESS
     msg["To"]      = RECIPIENT_EMAIL
@@ -177,35 +608,40 @@ def send_email(topic: str, articles: list[dict], summaries: dict[str,str]):
     msg.set_content("\n".join(text_lines))
     msg.add_alternative(html, subtype="html")
 
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as smtp:
-        smtp.starttls()
-        smtp.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-        smtp.send_message(msg)
+    get_smtp().send_message(msg)
 
 def main():
-    topic = input("Enter a topic keyword: ").strip()
+    parser = argparse.ArgumentParser(description="Email a digest of the latest news on a topic.")
+    parser.add_argument("topic", nargs="?", help="topic keyword (prompted for if omitted)")
+    parser.add_argument("--batch", action="store_true",
+                        help="summarize via the OpenAI Batch API: half the cost, "
+                             "but results can take up to 24h")
+    args = parser.parse_args()
+
+    topic = (args.topic or input("Enter a topic keyword: ")).strip()
     if not topic:
         sys.exit("No topic provided.")
 
-    api = fetch_newsapi(topic)
-    rss = asyncio.run(fetch_google_rss(topic))
-    all_articles = sort_by_date(api + rss)
+    # Print each source's articles as soon as it arrives rather than after both
+    print(f"Articles for topic '{topic}':\n")
+    numbers = itertools.count(1)
+    def show(articles):
+        for art, i in zip(articles, numbers):
+            print(f"{i}. [{art['source']}] {art['title']}")
+            print(f"   Link: {art['link']}")
+            if art.get("publishedAt"):
+                print(f"   Published: {art['publishedAt']}")
+            print()
 
-    print(f"Fetched {len(all_articles)} articles for topic '{topic}':\n")
-    for i, art in enumerate(all_articles, 1):
-        print(f"{i}. [{art['source']}] {art['title']}")
-        print(f"   Link: {art['link']}")
-        if art.get("publishedAt"):
-            print(f"   Published: {art['publishedAt']}")
-        print()
+    api, rss = asyncio.run(fetch_all(topic, on_fetched=show))
+    all_articles = dedupe(sort_by_date(api + rss))
+    print(f"Fetched {len(api) + len(rss)} articles ({len(all_articles)} unique).\n")
 
     print("Summaries of relevant articles:\n")
-    summaries = {}
-    for art in all_articles:
-        s = summarize_if_relevant(topic, art)
-        if s:
-            summaries[art["title"]] = s
-            print(f"- {art['title']}: {s}\n")
+    summaries = asyncio.run(summarize_batch(topic, filter_relevant(topic, all_articles),
+                                            use_batch_api=args.batch))
+    for title, s in summaries.items():
+        print(f"- {title}: {s}\n")
 
     if summaries:
         send_email(topic, all_articles, summaries)